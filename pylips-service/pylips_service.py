@@ -3,27 +3,44 @@
 PyLips微服务 - 为LEXI项目提供TTS和人脸动画控制
 """
 
+# eventlet需在其他模块导入前打补丁，使标准库socket/threading协作式运行
+import eventlet
+eventlet.monkey_patch()
+
 import os
 import sys
+import atexit
 import time
-import threading
-import subprocess
-from flask import Flask, request, jsonify
+import errno
+import types
+import functools
+from flask import Flask, Response, request, jsonify, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from flask_socketio import SocketIO
+import fastjsonschema
+import orjson
+from eventlet import tpool, wsgi
+from eventlet.greenpool import GreenPool
 import logging
 
 # 添加PyLips到路径
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'PyLips'))
+_PYLIPS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'PyLips'))
+sys.path.append(_PYLIPS_DIR)
 
 try:
     from pylips.speech import RobotFace
+    from pylips.speech.system_tts import SystemTTS
+    from pylips.speech.polly_tts import PollyTTS
     from pylips.face import FacePresets, ExpressionPresets
+    from pylips.face import start as face_start
+    import pygame
+    import socketio
     PYLIPS_AVAILABLE = True
 except ImportError as e:
     print(f"警告: PyLips模块导入失败: {e}")
     print("将使用备用TTS功能")
     RobotFace = None
+    face_start = None
     PYLIPS_AVAILABLE = False
 
 # 备用TTS实现
@@ -34,154 +51,466 @@ except ImportError:
     print("警告: pyttsx3不可用，TTS功能将受限")
     PYTTSX3_AVAILABLE = False
 
+# Windows下备用TTS引擎需在其工作线程内初始化COM单元
+try:
+    import pythoncom
+except ImportError:
+    pythoncom = None
+
+# 未打补丁的threading/queue，用于运行真正的系统线程
+_real_threading = eventlet.patcher.original('threading')
+_real_queue = eventlet.patcher.original('queue')
+
+class OrjsonProvider(DefaultJSONProvider):
+    """使用orjson序列化/解析JSON，jsonify与request.get_json均经由此处"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # 直接使用orjson输出的bytes作为响应体，省去str解码后再编码的往返
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app, origins=["http://localhost:3000", "http://localhost:5000"])  # 允许前端和LEXI后端访问
-socketio = SocketIO(app, cors_allowed_origins="*")
 
 # 配置日志  
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# PyLips面孔服务器地址及连接参数
+FACE_SERVER_PORT = 8000
+FACE_SERVER_URL = f'http://localhost:{FACE_SERVER_PORT}'
+FACE_CONNECT_RETRIES = 3
+FACE_CONNECT_BACKOFF = 0.5  # 第n次重连前等待n倍该秒数
+FACE_SPEECH_POLL_INTERVAL = 0.1
+TTS_SHUTDOWN_TIMEOUT = 1.0
+
+# 动作参数范围：时长单位毫秒，注视坐标单位毫米（以双眼中心为原点）
+MAX_DURATION_MS = 60000
+MAX_LOOK_DISTANCE_MM = 10000
+
+class _TtsJob:
+    """交给TTS工作线程执行的任务，执行结束后由该线程设置done"""
+    __slots__ = ('fn', 'args', 'done', 'result', 'error')
+    
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.done = _real_threading.Event()
+        self.result = None
+        self.error = None
+    
+    def run(self):
+        try:
+            self.result = self.fn(*self.args)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+if PYLIPS_AVAILABLE:
+    _TTS_BACKENDS = {'system': SystemTTS, 'polly': PollyTTS}
+    
+    class _LexiFace(RobotFace):
+        """TTS后端由外部传入的RobotFace：后端构造（加载音素识别模型等）耗时，需在事件循环外完成"""
+        
+        def __init__(self, tts, robot_name, server_ip, voice_id=None):
+            # 除TTS后端外与RobotFace.__init__一致
+            os.makedirs('pylips_phrases', exist_ok=True)
+            self.name = robot_name
+            self.voice_id = voice_id
+            self.io = socketio.Client()
+            try:
+                self.io.connect(server_ip)
+            except socketio.exceptions.ConnectionError as e:
+                logger.warning("连接面孔服务器失败: %s", e)
+            pygame.mixer.init()
+            self.channel = 0
+            self.tts = tts
+
+# 预定义表情映射（表情名 -> AU强度）
+_EXPRESSIONS = types.MappingProxyType({
+    'happy': {'AU6l': 0.8, 'AU6r': 0.8, 'AU12l': 0.6, 'AU12r': 0.6},
+    'sad': {'AU1l': 0.5, 'AU1r': 0.5, 'AU4l': 0.4, 'AU4r': 0.4, 'AU15l': 0.3, 'AU15r': 0.3},
+    'surprised': {'AU1l': 0.8, 'AU1r': 0.8, 'AU2l': 0.6, 'AU2r': 0.6, 'AU5l': 0.7, 'AU5r': 0.7},
+    'angry': {'AU4l': 0.8, 'AU4r': 0.8, 'AU7l': 0.6, 'AU7r': 0.6, 'AU23l': 0.4, 'AU23r': 0.4},
+    'neutral': {}
+})
+
+# 请求体校验器（导入时编译，未提供的可选字段按default补全）
+_validate_start = fastjsonschema.compile({
+    'type': 'object',
+    'properties': {
+        # voice_id为整数时，PyLips SystemTTS将其视为可用语音列表的下标
+        'voice_id': {'type': ['string', 'integer', 'null']},
+        'tts_method': {'enum': ['system', 'polly'], 'default': 'system'}
+    }
+})
+_validate_config = _validate_start
+_validate_speak = fastjsonschema.compile({
+    'type': 'object',
+    'required': ['text'],
+    'properties': {
+        'text': {'type': 'string'},
+        'wait': {'type': 'boolean', 'default': False}
+    }
+})
+_validate_expression = fastjsonschema.compile({
+    'type': 'object',
+    'required': ['expression'],
+    'properties': {
+        'expression': {'type': 'string'},
+        'duration': {'type': 'integer', 'minimum': 0, 'maximum': MAX_DURATION_MS, 'default': 1000}
+    }
+})
+_validate_look = fastjsonschema.compile({
+    'type': 'object',
+    'required': ['x', 'y', 'z'],
+    'properties': {
+        'x': {'type': 'number', 'minimum': -MAX_LOOK_DISTANCE_MM, 'maximum': MAX_LOOK_DISTANCE_MM},
+        'y': {'type': 'number', 'minimum': -MAX_LOOK_DISTANCE_MM, 'maximum': MAX_LOOK_DISTANCE_MM},
+        'z': {'type': 'number', 'minimum': -MAX_LOOK_DISTANCE_MM, 'maximum': MAX_LOOK_DISTANCE_MM},
+        'duration': {'type': 'integer', 'minimum': 0, 'maximum': MAX_DURATION_MS, 'default': 1000}
+    }
+})
+
 class PyLipsService:
     def __init__(self):
         self.face = None
-        self.face_server_process = None
+        self._face_cache = {}
+        self._face_server_listener = None
+        self._face_server_pool = None
+        self._face_server_thread = None
         self.face_server_running = False
         self.current_voice_id = None
         self.tts_method = 'system'
         self.fallback_tts = None
+        self._tts_queue = _real_queue.Queue()
+        self._tts_thread = None
+        self._health_body = None
+        self._status_body = None
+        self._refresh_state()
         
-        # 初始化备用TTS（始终尝试初始化）
-        if PYTTSX3_AVAILABLE:
-            try:
-                self.fallback_tts = pyttsx3.init()
-                logger.info("备用TTS引擎已初始化")
-            except Exception as e:
-                logger.error(f"初始化备用TTS失败: {e}")
-                self.fallback_tts = None
+        # TTS工作线程：备用TTS引擎在该系统线程中创建并独占使用；PyLips的TTS后端构造与语音合成
+        # 也经队列串行交给该线程，既不阻塞事件循环，也避免跨COM单元调用
+        if PYTTSX3_AVAILABLE or PYLIPS_AVAILABLE:
+            ready = _real_threading.Event()
+            self._tts_thread = _real_threading.Thread(target=self._tts_worker, args=(ready,), daemon=True)
+            self._tts_thread.start()
+            ready.wait()
+        
+    def _refresh_state(self):
+        """服务状态变化后重建/health和/status的缓存响应体"""
+        face_initialized = self.face is not None
+        self._health_body = orjson.dumps({
+            'status': 'healthy' if self.face_server_running and face_initialized else 'unavailable',
+            'face_server_running': self.face_server_running,
+            'face_initialized': face_initialized
+        })
+        self._status_body = orjson.dumps({
+            'face_server_running': self.face_server_running,
+            'face_initialized': face_initialized,
+            'current_voice_id': self.current_voice_id,
+            'tts_method': self.tts_method
+        })
+        
+    @property
+    def health_body(self):
+        """/health的预编码响应体"""
+        return self._health_body
+    
+    @property
+    def status_body(self):
+        """/status的预编码响应体"""
+        return self._status_body
+    
+    def _tts_worker(self, ready):
+        """TTS工作线程"""
+        if pythoncom:
+            pythoncom.CoInitialize()
+        try:
+            if PYTTSX3_AVAILABLE:
+                try:
+                    # pyttsx3.init()按驱动缓存并共享引擎，PyLips的SystemTTS也会调用它；
+                    # 直接构造Engine，使备用TTS独占该引擎
+                    self.fallback_tts = pyttsx3.Engine()
+                    logger.info("备用TTS引擎已初始化")
+                except Exception as e:
+                    logger.error("初始化备用TTS失败: %s", e)
+            ready.set()
+            
+            while True:
+                job = self._tts_queue.get()
+                if job is None:
+                    break
+                job.run()
+        finally:
+            if pythoncom:
+                pythoncom.CoUninitialize()
+    
+    def _submit_tts(self, fn, *args):
+        """将任务排入TTS工作线程"""
+        job = _TtsJob(fn, args)
+        self._tts_queue.put(job)
+        return job
+    
+    def _run_tts(self, fn, *args):
+        """在TTS工作线程中执行任务并协作式等待其结果"""
+        job = self._submit_tts(fn, *args)
+        # done由系统线程设置，在线程池中等待以免阻塞事件循环
+        tpool.execute(job.done.wait)
+        if job.error is not None:
+            raise job.error
+        return job.result
+    
+    def _fallback_say(self, text):
+        """备用TTS播放（在TTS工作线程中执行）"""
+        try:
+            self.fallback_tts.say(text)
+            self.fallback_tts.runAndWait()
+        except Exception as e:
+            logger.error("备用TTS播放失败: %s", e)
+        
+    def shutdown(self):
+        """退出时停止备用TTS工作线程，使其释放COM单元"""
+        if self._tts_thread and self._tts_thread.is_alive():
+            self._tts_queue.put(None)
+            self._tts_thread.join(timeout=TTS_SHUTDOWN_TIMEOUT)
         
     def start_face_server(self):
         """启动PyLips面孔服务器"""
         if self.face_server_running:
             return True
-            
+        
+        if face_start is None:
+            logger.error("PyLips不可用，无法启动面孔服务器")
+            return False
+        
+        # PyLips的SocketIO未指定async_mode，依赖自动检测；只有选中eventlet时才能由本进程的wsgi循环承载
+        if face_start.socketio.async_mode != 'eventlet':
+            logger.error("PyLips面孔服务器的SocketIO异步模式为%s，需要eventlet", face_start.socketio.async_mode)
+            return False
+        
         try:
-            # 启动PyLips面孔服务器
-            import subprocess
-            env = os.environ.copy()
-            env['PYTHONPATH'] = os.path.join(os.path.dirname(__file__), '..', '..', 'PyLips')
-            
-            self.face_server_process = subprocess.Popen([
-                sys.executable, '-m', 'pylips.face.start'
-            ], env=env, cwd=os.path.join(os.path.dirname(__file__), '..', '..', 'PyLips'),
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            
-            # 等待服务器启动
-            time.sleep(3)
-            
-            # 检查进程是否仍在运行
-            if self.face_server_process.poll() is not None:
-                # 进程已退出，捕获输出
-                out, err = self.face_server_process.communicate()
-                logger.error(f"PyLips面孔服务器启动失败，已退出。输出: {out}\n错误: {err}")
-                self.face_server_running = False
+            # 监听套接字在此同步创建，返回时端口即可连接，无需等待就绪
+            listener = eventlet.listen(('0.0.0.0', FACE_SERVER_PORT), reuse_port=False)
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE:
+                logger.error("启动PyLips面孔服务器失败: %s", e)
                 return False
-                
+            # 端口已被占用说明面孔服务器已在外部运行
             self.face_server_running = True
-            logger.info("PyLips面孔服务器已启动")
+            self._refresh_state()
+            logger.info("检测到PyLips面孔服务器已在运行")
             return True
-                
-        except Exception as e:
-            logger.error(f"启动PyLips面孔服务器失败: {e}")
-            return False
+        
+        # 在本进程的eventlet循环中运行面孔服务器（Flask-SocketIO应用）。代价是它与本服务的请求共用事件循环：
+        # 任何阻塞调用都会冻结浏览器端的Socket.IO通信（心跳、其他面孔的动画），
+        # 因此语音合成和TTS后端构造必须经_run_tts交给TTS工作线程
+        self._face_server_listener = listener
+        self._face_server_pool = GreenPool()
+        self._face_server_thread = eventlet.spawn(
+            wsgi.server, listener, face_start.app,
+            custom_pool=self._face_server_pool, log_output=False)
+        
+        self.face_server_running = True
+        self._refresh_state()
+        logger.info("PyLips面孔服务器已启动")
+        return True
     
     def stop_face_server(self):
         """停止PyLips面孔服务器"""
-        if self.face_server_process:
-            self.face_server_process.terminate()
-            self.face_server_process = None
-            self.face_server_running = False
+        # 先断开所有机器人面孔，再关闭服务器
+        self._release_face()
+        for face in self._face_cache.values():
+            self._disconnect_face(face)
+        self._face_cache.clear()
+        if self._face_server_thread:
+            self._face_server_thread.kill()
+            # 同时关闭已建立的浏览器/客户端连接
+            for connection in list(self._face_server_pool.coroutines_running):
+                connection.kill()
+            self._face_server_listener.close()
+            self._face_server_listener = None
+            self._face_server_pool = None
+            self._face_server_thread = None
             logger.info("PyLips面孔服务器已停止")
+        self.face_server_running = False
+        self._refresh_state()
+    
+    @staticmethod
+    def _disconnect_face(face):
+        """断开机器人面孔的Socket.IO连接"""
+        try:
+            face.io.disconnect()
+        except Exception as e:
+            logger.warning("断开面孔连接失败: %s", e)
+    
+    def _release_face(self):
+        """断开并丢弃当前机器人面孔，之后语音回退到备用TTS"""
+        if self.face is not None:
+            self._disconnect_face(self.face)
+            self._face_cache.pop(self.tts_method, None)
+        self.face = None
+    
+    @staticmethod
+    def _probe_connected(face):
+        """面孔的Socket.IO客户端是否已连接"""
+        return face.io.connected
+    
+    @classmethod
+    def _reconnect_face(cls, face):
+        """只重连面孔的Socket.IO客户端，不重新构造RobotFace；重连间隔逐次增加并让出事件循环"""
+        for attempt in range(1, FACE_CONNECT_RETRIES):
+            logger.warning("机器人面孔未连接到面孔服务器，第%s次重连...", attempt)
+            # 外部面孔服务器可能仍在启动，稍等再连
+            eventlet.sleep(FACE_CONNECT_BACKOFF * attempt)
+            try:
+                face.io.connect(FACE_SERVER_URL)
+            except Exception as e:
+                logger.warning("重连面孔服务器失败: %s", e)
+            if cls._probe_connected(face):
+                return True
+        return False
     
     def initialize_face(self, voice_id=None, tts_method='system'):
         """初始化机器人面孔"""
-        if not RobotFace:
+        if not PYLIPS_AVAILABLE:
             return False
+        
+        # TTS方法未变且面孔仍在连接时复用现有面孔：RobotFace每次合成时读取voice_id，直接替换即可
+        if self.face is not None and tts_method == self.tts_method:
+            if self._probe_connected(self.face) or self._reconnect_face(self.face):
+                if voice_id != self.current_voice_id:
+                    self.face.voice_id = voice_id
+                    self.current_voice_id = voice_id
+                    self._refresh_state()
+                    logger.info("机器人面孔语音已切换 - 语音ID: %s", voice_id)
+                return True
+            # 重连失败则丢弃该面孔并重建
+            logger.warning("当前机器人面孔已断开，重新创建")
+            self._release_face()
+            self._refresh_state()
+        
+        # 切换TTS方法时优先复用该方法之前创建且仍在连接的面孔
+        cached = self._face_cache.get(tts_method)
+        if cached is not None:
+            if self._probe_connected(cached):
+                self.face = cached
+                self.face.voice_id = voice_id
+                self.current_voice_id = voice_id
+                self.tts_method = tts_method
+                self._refresh_state()
+                logger.info("复用机器人面孔 - TTS方法: %s, 语音ID: %s", tts_method, voice_id)
+                return True
+            self._disconnect_face(cached)
+            del self._face_cache[tts_method]
             
+        # 新面孔连接成功后才切换为当前面孔，失败时保留原面孔及其TTS方法
         try:
-            self.face = RobotFace(
+            tts = self._run_tts(_TTS_BACKENDS[tts_method])
+            face = _LexiFace(
+                tts,
                 robot_name='LEXI',
-                server_ip='http://localhost:8000',
-                tts_method=tts_method,
+                server_ip=FACE_SERVER_URL,
                 voice_id=voice_id
             )
-            self.current_voice_id = voice_id
-            self.tts_method = tts_method
-            logger.info(f"机器人面孔已初始化 - TTS方法: {tts_method}, 语音ID: {voice_id}")
-            return True
-            
         except Exception as e:
-            logger.error(f"初始化机器人面孔失败: {e}")
+            logger.error("初始化机器人面孔失败: %s", e)
+            return False
+        
+        if not self._probe_connected(face) and not self._reconnect_face(face):
+            logger.error("机器人面孔无法连接到面孔服务器")
+            self._disconnect_face(face)
             return False
+        
+        self.face = face
+        self._face_cache[tts_method] = face
+        self.current_voice_id = voice_id
+        self.tts_method = tts_method
+        self._refresh_state()
+        logger.info("机器人面孔已初始化 - TTS方法: %s, 语音ID: %s", tts_method, voice_id)
+        return True
     
     def speak(self, text, wait=False):
         """让机器人说话"""
         # 优先使用PyLips
         if self.face:
             try:
-                self.face.say(text, wait=wait)
-                logger.info(f"PyLips语音播放: {text[:50]}...")
+                # 不调用RobotFace.say：其语音合成（调用espeak、音素识别）及wait时的pygame.time.wait
+                # 都会阻塞事件循环。合成交给TTS工作线程，发送口型与播放留在事件循环中
+                face = self.face
+                fname, times, visemes = self._run_tts(face.tts.gen_audio_and_visemes, text, face.voice_id)
+                self._play_face_speech(face, fname, times, visemes)
+                if wait:
+                    self._wait_face_speech()
+                logger.info("PyLips语音播放: %.50s...", text)
                 return True
             except Exception as e:
-                logger.error(f"PyLips语音播放失败: {e}")
+                logger.error("PyLips语音播放失败: %s", e)
         
         # 备用TTS
         if self.fallback_tts:
             try:
-                self.fallback_tts.say(text)
+                job = self._submit_tts(self._fallback_say, text)
                 if wait:
-                    self.fallback_tts.runAndWait()
-                else:
-                    # 在新线程中运行以避免阻塞
-                    def speak_async():
-                        self.fallback_tts.runAndWait()
-                    threading.Thread(target=speak_async, daemon=True).start()
-                logger.info(f"备用TTS播放: {text[:50]}...")
+                    # done由系统线程设置，在线程池中等待以免阻塞事件循环
+                    tpool.execute(job.done.wait)
+                logger.info("备用TTS播放: %.50s...", text)
                 return True
             except Exception as e:
-                logger.error(f"备用TTS播放失败: {e}")
+                logger.error("备用TTS播放失败: %s", e)
         
         logger.error("所有TTS方法都不可用")
         return False
     
+    @staticmethod
+    def _play_face_speech(face, fname, times, visemes):
+        """发送口型动画并播放已合成的语音（对应RobotFace.say合成之后的部分）"""
+        while pygame.mixer.Channel(face.channel).get_busy():
+            face.channel += 1
+        sound = pygame.mixer.Sound(fname)
+        face.io.emit('face_control', {
+            'name': face.name,
+            'action_type': 'say',
+            'visemes': visemes,
+            'times': times,
+        })
+        pygame.mixer.Channel(face.channel).play(sound)
+    
+    def _wait_face_speech(self):
+        """等待PyLips当前语音播放结束"""
+        channel = pygame.mixer.Channel(self.face.channel)
+        while channel.get_busy():
+            time.sleep(FACE_SPEECH_POLL_INTERVAL)
+    
     def set_expression(self, expression_name, duration=1000):
         """设置面部表情"""
         # 优先使用PyLips
         if self.face:
             try:
-                # 预定义表情映射
-                expressions = {
-                    'happy': {'AU6l': 0.8, 'AU6r': 0.8, 'AU12l': 0.6, 'AU12r': 0.6},
-                    'sad': {'AU1l': 0.5, 'AU1r': 0.5, 'AU4l': 0.4, 'AU4r': 0.4, 'AU15l': 0.3, 'AU15r': 0.3},
-                    'surprised': {'AU1l': 0.8, 'AU1r': 0.8, 'AU2l': 0.6, 'AU2r': 0.6, 'AU5l': 0.7, 'AU5r': 0.7},
-                    'angry': {'AU4l': 0.8, 'AU4r': 0.8, 'AU7l': 0.6, 'AU7r': 0.6, 'AU23l': 0.4, 'AU23r': 0.4},
-                    'neutral': {}
-                }
-                
-                if expression_name in expressions:
-                    self.face.express(expressions[expression_name], duration)
-                    logger.info(f"PyLips设置表情: {expression_name}")
-                    return True
-                else:
-                    logger.warning(f"未知表情: {expression_name}")
+                # express仅序列化AU表，不修改入参，可直接传入共享常量
+                aus = _EXPRESSIONS.get(expression_name)
+                if aus is None:
+                    logger.warning("未知表情: %s", expression_name)
                     return False
+                
+                self.face.express(aus, duration)
+                logger.info("PyLips设置表情: %s", expression_name)
+                return True
                     
             except Exception as e:
-                logger.error(f"PyLips设置表情失败: {e}")
+                logger.error("PyLips设置表情失败: %s", e)
         
         # 备用表情反馈（仅记录日志）
         if not PYLIPS_AVAILABLE:
-            logger.info(f"备用表情模式 - 表情: {expression_name}, 持续时间: {duration}ms")
+            logger.info("备用表情模式 - 表情: %s, 持续时间: %sms", expression_name, duration)
             # 这里可以添加其他表情反馈机制，比如发送到前端显示文字表情
             return True
         
@@ -194,11 +523,11 @@ class PyLipsService:
             
         try:
             self.face.look(x, y, z, duration)
-            logger.info(f"注视方向: ({x}, {y}, {z})")
+            logger.info("注视方向: (%s, %s, %s)", x, y, z)
             return True
             
         except Exception as e:
-            logger.error(f"控制注视失败: {e}")
+            logger.error("控制注视失败: %s", e)
             return False
     
     def stop_speech(self):
@@ -212,68 +541,87 @@ class PyLipsService:
             return True
             
         except Exception as e:
-            logger.error(f"停止语音失败: {e}")
+            logger.error("停止语音失败: %s", e)
             return False
 
 # 全局服务实例
 pylips_service = PyLipsService()
+atexit.register(pylips_service.shutdown)
+
+# 内容固定的响应体（导入时编码一次）
+_START_OK_BODIES = {
+    face_init: orjson.dumps({
+        'success': True,
+        'message': 'PyLips服务已启动',
+        'face_initialized': face_init,
+        'face_url': f'{FACE_SERVER_URL}/face/LEXI'  # 添加robot_name
+    })
+    for face_init in (True, False)
+}
+_START_FAILED_BODY = orjson.dumps({'success': False, 'message': '启动PyLips服务失败'})
+_STOP_OK_BODY = orjson.dumps({'success': True, 'message': 'PyLips服务已停止'})
+_STOP_SPEECH_OK_BODY = orjson.dumps({'success': True, 'message': '已停止语音'})
+_STOP_SPEECH_FAILED_BODY = orjson.dumps({'success': False, 'message': '停止语音失败'})
+
+def _body_response(body, status=200, headers=None):
+    """以预编码的响应体构造JSON响应"""
+    # Response对象会被CORS等after_request钩子修改，只能复用响应体，不能复用Response本身
+    return Response(body, status=status, mimetype='application/json', headers=headers)
+
+def require_json(validator):
+    """用编译好的校验器解析请求体，结果存入g.json，校验失败直接返回400"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(force=True, silent=True)
+            if data is None:
+                # 空请求体按{}处理（由schema补默认值），非空但无法解析则拒绝
+                if request.get_data(cache=True):
+                    return jsonify({'success': False, 'message': '参数错误: 请求体不是有效的JSON'}), 400
+                data = {}
+            try:
+                g.json = validator(data)
+            except fastjsonschema.JsonSchemaException as e:
+                return jsonify({'success': False, 'message': f'参数错误: {e.message}'}), 400
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查"""
-    status = 'healthy' if pylips_service.face_server_running and pylips_service.face is not None else 'unavailable'
-    return jsonify({
-        'status': status,
-        'face_server_running': pylips_service.face_server_running,
-        'face_initialized': pylips_service.face is not None
-    })
+    # 响应体仅在状态变化时重建，轮询时直接复用
+    return _body_response(pylips_service.health_body, headers={'Cache-Control': 'no-cache'})
 
 @app.route('/start', methods=['POST'])
+@require_json(_validate_start)
 def start_service():
     """启动PyLips服务"""
     success = pylips_service.start_face_server()
     if success:
-        # 等待服务器完全启动后初始化面孔
-        time.sleep(2)
-        data = request.get_json() or {}
-        voice_id = data.get('voice_id')
-        tts_method = data.get('tts_method', 'system')
+        # start_face_server返回时端口已可连接，可直接初始化面孔
+        voice_id = g.json.get('voice_id')
+        tts_method = g.json['tts_method']
         
         face_init = pylips_service.initialize_face(voice_id, tts_method)
         
-        return jsonify({
-            'success': True,
-            'message': 'PyLips服务已启动',
-            'face_initialized': face_init,
-            'face_url': 'http://localhost:8000/face/LEXI'  # 添加robot_name
-        })
+        return _body_response(_START_OK_BODIES[face_init])
     else:
-        return jsonify({
-            'success': False,
-            'message': '启动PyLips服务失败'
-        }), 500
+        return _body_response(_START_FAILED_BODY, 500)
 
 @app.route('/stop', methods=['POST'])
 def stop_service():
     """停止PyLips服务"""
     pylips_service.stop_face_server()
-    pylips_service.face = None
     
-    return jsonify({
-        'success': True,
-        'message': 'PyLips服务已停止'
-    })
+    return _body_response(_STOP_OK_BODY)
 
 @app.route('/speak', methods=['POST'])
+@require_json(_validate_speak)
 def speak():
     """语音合成并播放"""
-    data = request.get_json()
-    
-    if not data or 'text' not in data:
-        return jsonify({'success': False, 'message': '缺少text参数'}), 400
-    
-    text = data['text']
-    wait = data.get('wait', False)
+    text = g.json['text']
+    wait = g.json['wait']
     
     success = pylips_service.speak(text, wait)
     
@@ -289,15 +637,11 @@ def speak():
         }), 500
 
 @app.route('/expression', methods=['POST'])
+@require_json(_validate_expression)
 def set_expression():
     """设置面部表情"""
-    data = request.get_json()
-    
-    if not data or 'expression' not in data:
-        return jsonify({'success': False, 'message': '缺少expression参数'}), 400
-    
-    expression = data['expression']
-    duration = data.get('duration', 1000)
+    expression = g.json['expression']
+    duration = int(g.json['duration'])
     
     success = pylips_service.set_expression(expression, duration)
     
@@ -313,17 +657,14 @@ def set_expression():
         }), 500
 
 @app.route('/look', methods=['POST'])
+@require_json(_validate_look)
 def look():
     """控制注视方向"""
-    data = request.get_json()
-    
-    if not data or not all(k in data for k in ['x', 'y', 'z']):
-        return jsonify({'success': False, 'message': '缺少x, y, z参数'}), 400
-    
-    x = data['x']
-    y = data['y']
-    z = data['z']
-    duration = data.get('duration', 1000)
+    # 在入口处统一转换类型，下游插值计算无需再处理混合的int/float
+    x = float(g.json['x'])
+    y = float(g.json['y'])
+    z = float(g.json['z'])
+    duration = int(g.json['duration'])
     
     success = pylips_service.look_at(x, y, z, duration)
     
@@ -344,23 +685,16 @@ def stop_speech():
     success = pylips_service.stop_speech()
     
     if success:
-        return jsonify({
-            'success': True,
-            'message': '已停止语音'
-        })
+        return _body_response(_STOP_SPEECH_OK_BODY)
     else:
-        return jsonify({
-            'success': False,
-            'message': '停止语音失败'
-        }), 500
+        return _body_response(_STOP_SPEECH_FAILED_BODY, 500)
 
 @app.route('/config', methods=['POST'])
+@require_json(_validate_config)
 def update_config():
     """更新配置"""
-    data = request.get_json()
-    
-    voice_id = data.get('voice_id')
-    tts_method = data.get('tts_method', 'system')
+    voice_id = g.json.get('voice_id')
+    tts_method = g.json['tts_method']
     
     # 重新初始化面孔以应用新配置
     success = pylips_service.initialize_face(voice_id, tts_method)
@@ -381,12 +715,7 @@ def update_config():
 @app.route('/status', methods=['GET'])
 def get_status():
     """获取服务状态"""
-    return jsonify({
-        'face_server_running': pylips_service.face_server_running,
-        'face_initialized': pylips_service.face is not None,
-        'current_voice_id': pylips_service.current_voice_id,
-        'tts_method': pylips_service.tts_method
-    })
+    return _body_response(pylips_service.status_body)
 
 if __name__ == '__main__':
     print("启动PyLips微服务...")
@@ -401,5 +730,5 @@ if __name__ == '__main__':
     print("- GET /status - 获取状态")
     print("- GET /health - 健康检查")
     
-    # 启动Flask应用
-    app.run(host='0.0.0.0', port=3001, debug=False)
\ No newline at end of file
+    # 启动应用（eventlet协程WSGI服务器，请求可并发处理）
+    wsgi.server(eventlet.listen(('0.0.0.0', 3001)), app)
\ No newline at end of file
@@ -24,6 +24,8 @@ pip3 install -r requirements.txt
 export PYTHONPATH="${PYTHONPATH}:$(pwd)/../PyLips"
 export FLASK_ENV=production
 
-# 启动服务
+# 启动服务（eventlet单进程worker：面孔服务器与TTS引擎均为进程内状态，不能多进程共享）
+# worker心跳在事件循环中发送，--timeout需覆盖首次加载/下载音素识别模型等耗时操作，
+# 超时后worker被强制结束，进程内状态全部丢失
 echo "启动PyLips微服务在端口3001..."
-python3 pylips_service.py 
\ No newline at end of file
+exec gunicorn -k eventlet -w 1 --timeout 300 -b 0.0.0.0:3001 pylips_service:app 
\ No newline at end of file
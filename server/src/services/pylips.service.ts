@@ -2,7 +2,8 @@
  * PyLips服务接口 - 与Python微服务通信
  */
 
-import axios, { AxiosResponse } from 'axios';
+import axios, { AxiosInstance, AxiosResponse } from 'axios';
+import * as http from 'http';
 
 export interface PyLipsResponse {
     success: boolean;
@@ -13,18 +14,19 @@ export interface PyLipsResponse {
 export interface PyLipsStatus {
     face_server_running: boolean;
     face_initialized: boolean;
-    current_voice_id?: string;
+    current_voice_id?: string | number;
     tts_method: string;
 }
 
 export interface PyLipsConfig {
-    voice_id?: string;
+    voice_id?: string | number;  // 数字表示系统语音列表的下标
     tts_method?: 'system' | 'polly';
     wait?: boolean;
 }
 
 class PyLipsService {
     private baseUrl: string;
+    private client: AxiosInstance;
     private isConnected: boolean = false;
     private healthCheckInterval: NodeJS.Timeout | null = null;
     private reconnectAttempts: number = 0;
@@ -32,6 +34,12 @@ class PyLipsService {
 
     constructor() {
         this.baseUrl = process.env.PYLIPS_SERVICE_URL || 'http://localhost:3001';
+        // 复用长连接，避免每次请求都重新建立TCP连接；
+        // 空闲超时需短于服务端keep-alive（gunicorn默认2秒），以免复用已被服务端关闭的连接（ECONNRESET）
+        this.client = axios.create({
+            baseURL: this.baseUrl,
+            httpAgent: new http.Agent({ keepAlive: true, maxSockets: 16, timeout: 1500 })
+        });
         console.log('PyLips服务初始化，服务地址:', this.baseUrl);
         
         // 启动健康检查
@@ -94,7 +102,7 @@ class PyLipsService {
      */
     async isServiceAvailable(): Promise<boolean> {
         try {
-            const response = await axios.get(`${this.baseUrl}/health`, { 
+            const response = await this.client.get('/health', { 
                 timeout: 3000,
                 validateStatus: (status) => status === 200
             });
@@ -136,8 +144,8 @@ class PyLipsService {
             };
 
             console.log('🚀 正在启动PyLips服务...');
-            const response: AxiosResponse<PyLipsResponse> = await axios.post(
-                `${this.baseUrl}/start`,
+            const response: AxiosResponse<PyLipsResponse> = await this.client.post(
+                '/start',
                 payload,
                 { 
                     timeout: 15000,
@@ -181,8 +189,8 @@ class PyLipsService {
     async stopService(): Promise<PyLipsResponse> {
         try {
             console.log('🛑 正在停止PyLips服务...');
-            const response: AxiosResponse<PyLipsResponse> = await axios.post(
-                `${this.baseUrl}/stop`,
+            const response: AxiosResponse<PyLipsResponse> = await this.client.post(
+                '/stop',
                 {},
                 { 
                     timeout: 10000,
@@ -252,8 +260,8 @@ class PyLipsService {
             };
 
             console.log('🎤 正在进行语音合成...');
-            const response: AxiosResponse<PyLipsResponse> = await axios.post(
-                `${this.baseUrl}/speak`,
+            const response: AxiosResponse<PyLipsResponse> = await this.client.post(
+                '/speak',
                 payload,
                 { 
                     timeout: 30000,
@@ -308,8 +316,8 @@ class PyLipsService {
             }
 
             console.log('😊 正在设置表情:', expression);
-            const response: AxiosResponse<PyLipsResponse> = await axios.post(
-                `${this.baseUrl}/expression`,
+            const response: AxiosResponse<PyLipsResponse> = await this.client.post(
+                '/expression',
                 {
                     expression,
                     duration
@@ -367,8 +375,8 @@ class PyLipsService {
             }
 
             console.log('👀 正在控制注视方向:', { x, y, z, duration });
-            const response: AxiosResponse<PyLipsResponse> = await axios.post(
-                `${this.baseUrl}/look`,
+            const response: AxiosResponse<PyLipsResponse> = await this.client.post(
+                '/look',
                 {
                     x, y, z, duration
                 },
@@ -425,8 +433,8 @@ class PyLipsService {
             }
 
             console.log('🛑 正在停止语音播放...');
-            const response: AxiosResponse<PyLipsResponse> = await axios.post(
-                `${this.baseUrl}/stop-speech`,
+            const response: AxiosResponse<PyLipsResponse> = await this.client.post(
+                '/stop-speech',
                 {},
                 { 
                     timeout: 5000,
@@ -471,7 +479,7 @@ class PyLipsService {
      */
     async updateConfig(config: PyLipsConfig): Promise<PyLipsResponse> {
         try {
-            const response: AxiosResponse<PyLipsResponse> = await axios.post(`${this.baseUrl}/config`, config);
+            const response: AxiosResponse<PyLipsResponse> = await this.client.post('/config', config);
             return response.data;
         } catch (error) {
             console.error('更新配置失败:', error.message);
@@ -487,7 +495,7 @@ class PyLipsService {
      */
     async getStatus(): Promise<PyLipsStatus | null> {
         try {
-            const response: AxiosResponse<PyLipsStatus> = await axios.get(`${this.baseUrl}/status`);
+            const response: AxiosResponse<PyLipsStatus> = await this.client.get('/status');
             return response.data;
         } catch (error) {
             console.error('获取状态失败:', error.message);